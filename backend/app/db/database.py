@@ -1,10 +1,13 @@
+# Database package initialization
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import QueuePool
-from contextlib import contextmanager
+import time
+import asyncio
+from asyncio import current_task
+from sqlalchemy import text
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, async_scoped_session, AsyncSession
 from dotenv import load_dotenv
-from typing import Generator
+from typing import AsyncGenerator
 
 # Load environment variables
 load_dotenv()
@@ -16,54 +19,113 @@ MYSQL_USER = os.getenv("MYSQL_USER", "codeanalysis")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "secret")
 MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "codeanalysis")
 
+# Connection pool sizing, per worker process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_POOL_OVERFLOW = int(os.getenv("DB_POOL_OVERFLOW", "40"))
+
+# Set when MYSQL_HOST/MYSQL_PORT point at an external pooler (e.g. ProxySQL), which then owns pooling
+DB_EXTERNAL_POOLER = os.getenv("DB_EXTERNAL_POOLER", "false").lower() == "true"
+
 # Export variables for use in other modules
-__all__ = ['MYSQL_HOST', 'MYSQL_PORT', 'MYSQL_USER', 'MYSQL_PASSWORD', 'MYSQL_DATABASE', 'DATABASE_URL', 'get_db', 'init_db']
-
-# Construct database URL
-DATABASE_URL = f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
-
-# Create SQLAlchemy engine with connection pooling
-engine = create_engine(
-    DATABASE_URL,
-    poolclass=QueuePool,
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30,
-    pool_pre_ping=True,
-    pool_recycle=3600,
-)
+__all__ = ['MYSQL_HOST', 'MYSQL_PORT', 'MYSQL_USER', 'MYSQL_PASSWORD', 'MYSQL_DATABASE', 'DATABASE_URL', 'SYNC_DATABASE_URL', 'ScopedSession', 'SessionManager', 'get_db', 'init_db']
+
+# Construct database URLs: asyncmy (Cython) for the app's async engine,
+# mysqlclient (libmysqlclient binding) for synchronous tools such as Alembic
+DATABASE_URL = f"mysql+asyncmy://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}?charset=utf8mb4"
+SYNC_DATABASE_URL = f"mysql+mysqldb://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}?charset=utf8mb4"
+
+# Behind an external pooler every worker shares its connections, so don't hold a pool per process
+if DB_EXTERNAL_POOLER:
+    pool_options = {"poolclass": NullPool}
+else:
+    pool_options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_POOL_OVERFLOW,
+        "pool_timeout": 30,
+        "pool_pre_ping": True,
+        "pool_recycle": 3600,
+        # Reuse the most recently returned connection so idle ones can age out
+        "pool_use_lifo": True,
+    }
 
-# Create sessionmaker
-SessionLocal = sessionmaker(
+# Create async SQLAlchemy engine
+engine = create_async_engine(DATABASE_URL, **pool_options)
+
+# Create async sessionmaker
+AsyncSessionLocal = async_sessionmaker(
     bind=engine,
-    autocommit=False,
+    class_=AsyncSession,
     autoflush=False,
     expire_on_commit=False
 )
 
-def get_db() -> Generator[Session, None, None]:
-    """Get database session with automatic cleanup."""
-    db = SessionLocal()
-    try:
+# Session registry scoped to the current asyncio task, so each request reuses one session
+ScopedSession = async_scoped_session(AsyncSessionLocal, scopefunc=current_task)
+
+class SessionManager:
+    """Async context manager yielding the task-scoped session.
+
+    Rolls back on error and removes the session from the registry on exit,
+    which closes it and returns its connection to the pool exactly once.
+    Pass read_only=True for sessions that only SELECT: they have nothing to
+    undo, so errors (such as a 404 raised inside the block) skip the rollback.
+    """
+
+    def __init__(self, read_only: bool = False):
+        self.read_only = read_only
+
+    async def __aenter__(self) -> AsyncSession:
+        self.db = ScopedSession()
+        return self.db
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        try:
+            if exc_type is not None and not self.read_only:
+                await self.db.rollback()
+        finally:
+            await ScopedSession.remove()
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    """Get the task-scoped database session with automatic cleanup."""
+    async with SessionManager() as db:
         yield db
-    finally:
-        db.close()
 
-def init_db() -> None:
+async def init_db() -> None:
     """Initialize database tables."""
     from .models import Base
-    Base.metadata.create_all(bind=engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+# A successful ping is trusted for this many seconds, so frequent health probes don't each hit MySQL
+DB_PING_CACHE_SECONDS = 5.0
+# Upper bound on a ping, so a hung database fails the probe instead of stalling it
+DB_PING_TIMEOUT_SECONDS = 2.0
+# Outcome and completion time of the most recent ping, pass or fail
+_last_ping_ok = False
+_last_ping_ts = float("-inf")
+# Only one ping in flight; probes that arrive while it runs reuse its outcome instead of pinging in turn
+_ping_lock = asyncio.Lock()
 
-def check_db_connection() -> bool:
+async def _ping() -> None:
+    # A bare pooled connection is enough for a ping; no Session needed
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+async def check_db_connection() -> bool:
     """Check if database connection is working."""
-    try:
-        from sqlalchemy import text
-        db = SessionLocal()
+    global _last_ping_ok, _last_ping_ts
+    arrived = time.monotonic()
+    if _last_ping_ok and arrived - _last_ping_ts < DB_PING_CACHE_SECONDS:
+        return True
+    async with _ping_lock:
+        # A ping that finished while this probe waited answers it, whether it passed or failed
+        if _last_ping_ts >= arrived:
+            return _last_ping_ok
         try:
-            db.execute(text("SELECT 1"))
-            return True
-        finally:
-            db.close()
-    except Exception as e:
-        print(f"Database connection error: {str(e)}")
-        return False
+            await asyncio.wait_for(_ping(), timeout=DB_PING_TIMEOUT_SECONDS)
+            _last_ping_ok = True
+        except Exception as e:
+            print(f"Database connection error: {str(e) or type(e).__name__}")
+            _last_ping_ok = False
+        _last_ping_ts = time.monotonic()
+        return _last_ping_ok
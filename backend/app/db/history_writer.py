@@ -0,0 +1,98 @@
+# Batched background writes of history records
+import asyncio
+import logging
+import os
+from typing import List, Optional
+
+from sqlalchemy import insert
+
+from .database import AsyncSessionLocal
+from .models import HistoryRecordDB
+
+logger = logging.getLogger(__name__)
+
+# Write at most BATCH_SIZE records per INSERT, waiting up to BATCH_WINDOW seconds for a batch to fill
+BATCH_SIZE = 50
+BATCH_WINDOW = 0.1
+
+# A failed batch is retried this many times, RETRY_DELAY seconds apart (doubling each time),
+# before its records are written one by one so only the failing ones are lost
+WRITE_RETRIES = 3
+RETRY_DELAY = 0.5
+
+# Columns set by the application; created_at/updated_at are filled in by server defaults
+_INSERT_COLUMNS = [column.key for column in HistoryRecordDB.__table__.columns if column.server_default is None]
+
+# Records waiting to be written; endpoints put fully built records here instead of committing.
+# Bounded, so if the database falls behind, put() blocks and requests slow down instead of piling up
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "1000"))
+pending_records: "asyncio.Queue[HistoryRecordDB]" = asyncio.Queue(maxsize=HISTORY_QUEUE_SIZE)
+
+_flush_task: Optional[asyncio.Task] = None
+
+async def _next_batch() -> List[HistoryRecordDB]:
+    """Wait for one record, then keep collecting until the batch is full or the window closes."""
+    batch = [await pending_records.get()]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + BATCH_WINDOW
+    while len(batch) < BATCH_SIZE:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(pending_records.get(), remaining))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+async def write_batch(records: List[HistoryRecordDB]) -> None:
+    """Insert records with a single multi-row INSERT and one commit."""
+    rows = [{key: getattr(record, key) for key in _INSERT_COLUMNS} for record in records]
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(HistoryRecordDB), rows)
+        await db.commit()
+
+async def _write_with_retry(batch: List[HistoryRecordDB]) -> None:
+    """Write a batch, retrying transient failures, then falling back to one INSERT per record."""
+    delay = RETRY_DELAY
+    for attempt in range(1, WRITE_RETRIES + 1):
+        try:
+            await write_batch(batch)
+            return
+        except Exception as e:
+            logger.warning(f"Writing {len(batch)} history records failed (attempt {attempt}/{WRITE_RETRIES}): {str(e)}")
+            if attempt < WRITE_RETRIES:
+                await asyncio.sleep(delay)
+                delay *= 2
+    
+    # Isolate the bad rows so the rest of the batch is still stored
+    for record in batch:
+        try:
+            await write_batch([record])
+        except Exception as e:
+            logger.error(f"Dropping history record {record.aid}: {str(e)}")
+
+async def _flush_loop() -> None:
+    """Drain pending_records in batches for the lifetime of the application."""
+    while True:
+        batch = await _next_batch()
+        try:
+            await _write_with_retry(batch)
+        finally:
+            for _ in batch:
+                pending_records.task_done()
+
+def start_history_writer() -> None:
+    """Start the background flush task."""
+    global _flush_task
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(_flush_loop())
+
+async def stop_history_writer() -> None:
+    """Wait for queued records to be written, then stop the flush task."""
+    global _flush_task
+    if _flush_task is None:
+        return
+    await pending_records.join()
+    _flush_task.cancel()
+    _flush_task = None
@@ -1,14 +1,50 @@
-from sqlalchemy import Column, String, DateTime, Text, JSON, func
+import orjson
+import zstandard
+from sqlalchemy import Column, CHAR, String, DateTime, Text, Index, func
+from sqlalchemy.dialects.mysql import LONGBLOB
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.types import TypeDecorator, LargeBinary
 
 Base = declarative_base()
 
+# Shared codec instances; level 3 is zstd's default speed/ratio trade-off
+_ZSTD_COMPRESSOR = zstandard.ZstdCompressor(level=3)
+_ZSTD_DECOMPRESSOR = zstandard.ZstdDecompressor()
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+class ORJsonBlob(TypeDecorator):
+    """JSON value stored as zstd-compressed orjson bytes.
+
+    Values written before compression was introduced are plain orjson bytes and
+    are told apart by the zstd frame magic number.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        # Plain BLOB caps out at 64 KB, too small for large analysis results
+        if dialect.name == "mysql":
+            return dialect.type_descriptor(LONGBLOB())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return _ZSTD_COMPRESSOR.compress(orjson.dumps(value))
+
+    def process_result_value(self, value, dialect):
+        if not value:
+            return None
+        if value[:4] == _ZSTD_MAGIC:
+            value = _ZSTD_DECOMPRESSOR.decompress(value)
+        return orjson.loads(value)
+
 class HistoryRecordDB(Base):
     """SQLAlchemy model for storing analysis history records."""
     __tablename__ = "history_records"
 
     # Primary key and record identification
-    aid = Column(String(36), primary_key=True, comment="Unique identifier for the analysis record")
+    aid = Column(CHAR(32), primary_key=True, comment="Unique identifier for the analysis record (UUID hex)")
     
     # Core analysis metadata
     timestamp = Column(DateTime, nullable=False, comment="Timestamp when the analysis was performed")
@@ -16,7 +52,7 @@ class HistoryRecordDB(Base):
     commit_hash = Column(String(40), nullable=False, comment="Git commit hash")
     
     # Analysis data
-    analysis_result = Column(JSON, nullable=False, comment="Complete analysis results in JSON format")
+    analysis_result = Column(ORJsonBlob, nullable=False, comment="Complete analysis results as orjson-encoded JSON")
     status = Column(String(50), nullable=False, default="completed", comment="Analysis status")
     notes = Column(Text, nullable=True, comment="Optional notes or feedback")
     
@@ -30,6 +66,13 @@ class HistoryRecordDB(Base):
         comment="Last update timestamp"
     )
 
+    __table_args__ = (
+        # Lets the newest-first history listing (ties broken by aid) read the index in order instead of filesorting
+        Index("ix_history_timestamp_aid_desc", timestamp.desc(), aid.desc()),
+        # Lookup of an existing analysis for a commit
+        Index("ix_history_repository_commit", repository, commit_hash),
+    )
+
     def __repr__(self):
         """String representation of the record."""
         return f"<HistoryRecord(aid={self.aid}, repository={self.repository}, commit={self.commit_hash})>"
@@ -44,6 +87,7 @@ class HistoryRecordDB(Base):
             "analysisResult": self.analysis_result,
             "status": self.status,
             "notes": self.notes,
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat()
+            # Server-generated, so unset until the record has been written
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None
         }
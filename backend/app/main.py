@@ -1,21 +1,22 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
 from pydantic import BaseModel
 import json
 from typing import List, Dict, Any, Optional
 import asyncio
 import uuid
 from datetime import datetime
+from cachetools import TTLCache
 
-from app.services.github_service import GitHubService, GitHubError
-from app.services.analysis_service import AnalysisService, AnalysisError
+from app.services.github_service import GitHubError, get_github_service
+from app.services.analysis_service import AnalysisError, get_analysis_service
 
 # Import database dependencies
-from app.db.database import get_db
+from app.db.database import SessionManager
+from app.db.history_writer import pending_records, start_history_writer, stop_history_writer
 from app.db.models import HistoryRecordDB
-from sqlalchemy.orm import Session
-from fastapi import Depends
+from sqlalchemy import and_, bindparam, or_, select
 
 app = FastAPI(
     title="Code Analysis Agent API",
@@ -49,9 +50,47 @@ def init_services():
     """Initialize GitHub and Analysis services if not already initialized."""
     global github_service, analysis_service
     if github_service is None:
-        github_service = GitHubService()
+        github_service = get_github_service()
     if analysis_service is None:
-        analysis_service = AnalysisService()
+        analysis_service = get_analysis_service()
+
+@app.on_event("startup")
+async def startup():
+    """Start the background writer that batches history record inserts."""
+    start_history_writer()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Flush queued history records, persist caches and close HTTP clients before exiting."""
+    await stop_history_writer()
+    if github_service is not None:
+        await github_service.aclose()
+    if analysis_service is not None:
+        analysis_service.save_cache()
+        await analysis_service.aclose()
+
+# Columns served by the history list; the full analysis_result is only returned per record
+HISTORY_SUMMARY_COLUMNS = (
+    HistoryRecordDB.aid,
+    HistoryRecordDB.timestamp,
+    HistoryRecordDB.repository,
+    HistoryRecordDB.commit_hash.label("commit"),
+    HistoryRecordDB.status,
+)
+
+# Statements built once at import, so each request reuses the same statement object
+HISTORY_BY_AID = select(HistoryRecordDB).where(HistoryRecordDB.aid == bindparam("aid"))
+LATEST_ANALYSIS_FOR_COMMIT = (
+    select(HistoryRecordDB)
+    .where(HistoryRecordDB.repository == bindparam("repository"))
+    .where(HistoryRecordDB.commit_hash == bindparam("commit_hash"))
+    .where(HistoryRecordDB.status == "completed")
+    .order_by(HistoryRecordDB.timestamp.desc())
+    .limit(1)
+)
+
+# Completed history records never change, so serialized lookups by aid are cached in-process
+_aid_cache = TTLCache(maxsize=4096, ttl=300)
 
 # Request model for commit analysis
 
@@ -61,93 +100,176 @@ class CommitAnalysisRequest(BaseModel):
 @app.get("/healthz")
 async def healthz():
     """Health check endpoint that verifies database connection."""
-    from app.db.database import check_db_connection
-    db_status = "ok" if check_db_connection() else "error"
+    from app.db.database import check_db_connection, engine
+    db_status = "ok" if await check_db_connection() else "error"
     return {
         "status": "ok",
         "database": db_status,
+        # Checked-in/checked-out counts, to confirm connections are reused rather than churned
+        "pool": engine.pool.status(),
         "timestamp": datetime.utcnow().isoformat()
     }
 
+def normalize_aid(aid: str) -> str:
+    """Accept aids issued in the older dashed UUID format."""
+    return aid.replace("-", "")
+
+def analysis_status(analysis_results: Dict) -> str:
+    """Status to store for an analysis: "partial" if any file's analysis failed."""
+    if any("error" in file.get("analysis", {}) for file in analysis_results.get("files", [])):
+        return "partial"
+    return "completed"
+
+async def find_latest_analysis(repository: str, commit_hash: str) -> Optional[HistoryRecordDB]:
+    """Return the most recent completed analysis of a commit, if any.
+
+    Records stored as "completed" before failed files were marked "partial" are
+    checked too, so an analysis with failed files is never reused.
+    """
+    async with SessionManager(read_only=True) as db:
+        result = await db.execute(
+            LATEST_ANALYSIS_FOR_COMMIT, {"repository": repository, "commit_hash": commit_hash}
+        )
+        record = result.scalars().first()
+    if record is not None and analysis_status(record.analysis_result) != "completed":
+        return None
+    return record
+
 @app.get("/api/history")
-async def list_history_records(db: Session = Depends(get_db)):
-    """List all history records"""
-    records = db.query(HistoryRecordDB).order_by(HistoryRecordDB.timestamp.desc()).all()
-    return [record.to_dict() for record in records]
+async def list_history_records(
+    limit: int = Query(50, ge=1, le=200),
+    before: Optional[str] = None,
+    before_aid: Optional[str] = None
+):
+    """List history record summaries, newest first.
+
+    Pass the timestamp and aid of the last record received as `before` and
+    `before_aid` to fetch the next page.
+    """
+    # aid breaks ties between records created in the same second, so none are skipped between pages
+    stmt = (
+        select(*HISTORY_SUMMARY_COLUMNS)
+        .order_by(HistoryRecordDB.timestamp.desc(), HistoryRecordDB.aid.desc())
+        .limit(limit)
+    )
+    if before:
+        try:
+            before_ts = datetime.fromisoformat(before)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid 'before' timestamp, expected ISO 8601")
+        if before_aid:
+            # Spelled out rather than as a row comparison, which MySQL is less likely to turn into an index range
+            stmt = stmt.where(or_(
+                HistoryRecordDB.timestamp < before_ts,
+                and_(HistoryRecordDB.timestamp == before_ts, HistoryRecordDB.aid < normalize_aid(before_aid))
+            ))
+        else:
+            stmt = stmt.where(HistoryRecordDB.timestamp < before_ts)
+    async with SessionManager(read_only=True) as db:
+        result = await db.execute(stmt)
+        return [dict(row._mapping) for row in result.all()]
 
 @app.get("/api/history/{aid}")
-async def get_history_record(aid: str, db: Session = Depends(get_db)):
+async def get_history_record(aid: str):
     """Get a specific history record by aid"""
-    record = db.query(HistoryRecordDB).filter(HistoryRecordDB.aid == aid).first()
-    if not record:
-        raise HTTPException(status_code=404, detail="History record not found")
-    return record.to_dict()
+    aid = normalize_aid(aid)
+    cached = _aid_cache.get(aid)
+    if cached is not None:
+        return cached
+    async with SessionManager(read_only=True) as db:
+        result = await db.execute(HISTORY_BY_AID, {"aid": aid})
+        record = result.scalar_one_or_none()
+        if not record:
+            raise HTTPException(status_code=404, detail="History record not found")
+        record_dict = record.to_dict()
+    if record.status == "completed":
+        _aid_cache[aid] = record_dict
+    return record_dict
 
 @app.post("/api/history/{aid}/reanalyze")
-async def reanalyze_history_record(aid: str, db: Session = Depends(get_db)):
+async def reanalyze_history_record(aid: str):
     """Re-analyze a specific commit from history"""
+    aid = normalize_aid(aid)
+    # Only the lookup needs the database; release the connection before the slow GitHub/LLM calls
+    async with SessionManager(read_only=True) as db:
+        result = await db.execute(HISTORY_BY_AID, {"aid": aid})
+        existing_record = result.scalar_one_or_none()
+    if not existing_record:
+        raise HTTPException(status_code=404, detail="History record not found")
+    
     try:
         # Initialize services if needed
         init_services()
         
-        # Get existing record from database
-        existing_record = db.query(HistoryRecordDB).filter(HistoryRecordDB.aid == aid).first()
-        if not existing_record:
-            raise HTTPException(status_code=404, detail="History record not found")
-        
         # Get commit changes from GitHub
-        changes = github_service.get_commit_changes(
+        changes = await github_service.get_commit_changes(
             f"https://github.com/{existing_record.repository}/commit/{existing_record.commit_hash}"
         )
-        
         if not changes.get("files"):
             raise HTTPException(status_code=400, detail="No files found in commit")
         
-        try:
-            # Re-analyze changes with timeout
-            analysis_results = await asyncio.wait_for(
-                analysis_service.analyze_changes(changes),
-                timeout=60.0
-            )
-            
-            # Create new history record for re-analysis
-            new_aid = str(uuid.uuid4())
-            new_record = HistoryRecordDB(
-                aid=new_aid,
-                timestamp=datetime.utcnow(),
-                repository=existing_record.repository,
-                commit_hash=existing_record.commit_hash,
-                analysis_result=analysis_results,
-                status="completed",
-                notes=f"Re-analysis of {aid}"
-            )
-            
-            db.add(new_record)
-            db.commit()
-            return new_record.to_dict()
-        except asyncio.TimeoutError:
-            db.rollback()
-            raise HTTPException(
-                status_code=504,
-                detail="Analysis timed out. Please try again with a smaller commit."
-            )
-        except Exception as e:
-            db.rollback()
-            if isinstance(e, HTTPException):
-                raise e
-            raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        db.close()
+        # Re-analyze changes with timeout
+        analysis_results = await asyncio.wait_for(
+            analysis_service.analyze_changes(changes),
+            timeout=60.0
+        )
+        
+        # Create new history record for re-analysis
+        new_aid = uuid.uuid4().hex
+        new_record = HistoryRecordDB(
+            aid=new_aid,
+            timestamp=datetime.utcnow(),
+            repository=existing_record.repository,
+            commit_hash=existing_record.commit_hash,
+            analysis_result=analysis_results,
+            status=analysis_status(analysis_results),
+            notes=f"Re-analysis of {aid}"
+        )
+        
+        # Queue for the batched background insert
+        await pending_records.put(new_record)
+        return new_record.to_dict()
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail="Analysis timed out. Please try again with a smaller commit."
+        )
+    except (ValueError, GitHubError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AnalysisError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @app.post("/api/analyze")
-async def analyze_commit(request: CommitAnalysisRequest, db: Session = Depends(get_db)):
-    """Analyze a commit and store results in database."""
+async def analyze_commit(request: CommitAnalysisRequest, force: bool = False):
+    """Analyze a commit and store results in database.
+
+    Commits are immutable, so an existing completed analysis of the same commit
+    is returned as-is unless `force` is set.
+    """
     try:
         # Initialize services if needed
         init_services()
         
+        parsed = github_service.parse_commit_url(request.commit_url)
+        if not parsed:
+            raise GitHubError("Invalid GitHub commit URL format")
+        
+        if not force:
+            existing_record = await find_latest_analysis(
+                f"{parsed['owner']}/{parsed['repo']}", parsed["commit_hash"]
+            )
+            if existing_record:
+                return {
+                    **existing_record.analysis_result,
+                    "aid": existing_record.aid
+                }
+        
         # Get commit changes from GitHub
-        changes = github_service.get_commit_changes(request.commit_url)
+        changes = await github_service.get_commit_changes(request.commit_url)
         if not changes.get("files"):
             raise HTTPException(status_code=400, detail="No files found in commit")
             
@@ -159,19 +281,18 @@ async def analyze_commit(request: CommitAnalysisRequest, db: Session = Depends(g
             )
             
             # Create history record
-            aid = str(uuid.uuid4())
+            aid = uuid.uuid4().hex
             history_record = HistoryRecordDB(
                 aid=aid,
                 timestamp=datetime.utcnow(),
                 repository=changes.get("repository", ""),
                 commit_hash=changes.get("commit", ""),
                 analysis_result=analysis_results,
-                status="completed"
+                status=analysis_status(analysis_results)
             )
             
-            # Save to database
-            db.add(history_record)
-            db.commit()
+            # Queue for the batched background insert
+            await pending_records.put(history_record)
             
             # Return analysis results with aid
             return {
@@ -179,21 +300,63 @@ async def analyze_commit(request: CommitAnalysisRequest, db: Session = Depends(g
                 "aid": aid
             }
         except asyncio.TimeoutError:
-            db.rollback()
             raise HTTPException(
                 status_code=504,
                 detail="Analysis timed out. Please try again with a smaller commit."
             )
     except (ValueError, GitHubError) as e:
-        db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
     except AnalysisError as e:
-        db.rollback()
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        db.rollback()
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    finally:
-        db.close()
+
+@app.post("/api/analyze/stream")
+async def analyze_commit_stream(request: CommitAnalysisRequest):
+    """Analyze a commit, streaming progress as newline-delimited JSON events.
+
+    Errors fetching the commit are returned as regular HTTP errors. Once
+    streaming starts, a failure is reported as a final {"event": "error"} line.
+    The last "complete" event carries the full result and its aid, and the
+    record is stored like a regular analysis.
+    """
+    try:
+        # Initialize services if needed
+        init_services()
+        
+        # Get commit changes from GitHub
+        changes = await github_service.get_commit_changes(request.commit_url)
+        if not changes.get("files"):
+            raise HTTPException(status_code=400, detail="No files found in commit")
+    except (ValueError, GitHubError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except AnalysisError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    
+    async def events():
+        try:
+            async for event in analysis_service.stream_changes(changes):
+                if event["event"] == "complete":
+                    analysis_results = {key: value for key, value in event.items() if key != "event"}
+                    aid = uuid.uuid4().hex
+                    # Queue for the batched background insert
+                    await pending_records.put(HistoryRecordDB(
+                        aid=aid,
+                        timestamp=datetime.utcnow(),
+                        repository=changes.get("repository", ""),
+                        commit_hash=changes.get("commit", ""),
+                        analysis_result=analysis_results,
+                        status=analysis_status(analysis_results)
+                    ))
+                    event = {**event, "aid": aid}
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "detail": f"Analysis failed: {str(e)}"}) + "\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
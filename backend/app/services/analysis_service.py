@@ -1,61 +1,144 @@
-from typing import List, Dict, Optional
-from langchain.prompts import PromptTemplate
+from typing import Annotated, Any, AsyncIterator, List, Dict, Optional
+from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
+from langchain.schema import SystemMessage
 from langchain_openai import ChatOpenAI
-from langchain.schema.runnable import RunnablePassthrough
-from pydantic import SecretStr
+from langchain.schema.runnable import RunnableBranch, RunnablePassthrough
+from pydantic import AfterValidator, BaseModel, ConfigDict, SecretStr, TypeAdapter, ValidationError
 import os
-import json
-import re
+import copy
+import functools
+import orjson
 import logging
+import asyncio
+import httpx
+import tiktoken
 from dotenv import load_dotenv
 
+from app.services.semantic_cache import SemanticCache
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv(verbose=True)
+@functools.lru_cache(maxsize=1)
+def _load_environment() -> None:
+    """Load .env once per process, on first service construction rather than at import."""
+    load_dotenv(verbose=True)
 
-# Verify environment setup
-if not os.getenv("OPENAI_API_KEY"):
-    logger.error("OpenAI API key not found in environment variables")
-    raise EnvironmentError("OPENAI_API_KEY environment variable is required")
+# Seconds one file's streamed response may take, matching the timeout of the non-streaming endpoints
+STREAM_FILE_TIMEOUT = 60.0
 
-class AnalysisError(Exception):
-    """Custom exception for analysis errors"""
-    pass
+# Cap on files per combined request. The analyses in one reply are generated one after
+# another, so this bounds its latency as well as the size of its JSON
+MAX_FILES_PER_REQUEST = 3
 
-class AnalysisService:
-    def __init__(self):
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise AnalysisError("OpenAI API key not found. Please set OPENAI_API_KEY environment variable.")
-            
+# Rough UTF-8 bytes per token, used to estimate sizes when no tokenizer is available
+BYTES_PER_TOKEN = 3
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model: str) -> Optional["tiktoken.Encoding"]:
+    """Tokenizer for a chat model, or None if it can't be loaded.
+
+    tiktoken downloads the encoding on first use unless it is already in
+    TIKTOKEN_CACHE_DIR; a failed download is cached as None, so requests fall
+    back to byte estimates instead of retrying it.
+    """
+    try:
         try:
-            if not api_key:
-                raise ValueError("OpenAI API key is required")
-            
-            logger.info("Initializing ChatOpenAI with API key")
-            self.llm = ChatOpenAI(
-                model="gpt-4",
-                temperature=0,
-                api_key=SecretStr(api_key)
-            )
-            # Verify the LLM is properly initialized
-            if not self.llm:
-                raise ValueError("ChatOpenAI initialization failed")
-            logger.info("ChatOpenAI initialized successfully")
-        except Exception as e:
-            logger.error(f"Failed to initialize ChatOpenAI: {str(e)}")
-            raise AnalysisError(f"Failed to initialize ChatOpenAI: {str(e)}")
-        
-        self.analysis_prompt = PromptTemplate(
-            input_variables=["file_name", "file_type", "code_changes", "android_api_changes"],
-            template="""Analyze the following code changes from file {file_name} (type: {file_type}) for compatibility issues and semantic changes.
-Detected Android API changes: {android_api_changes}
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"Tokenizer for {model} unavailable, estimating token counts: {str(e)}")
+        return None
 
-Code changes to analyze:
-{code_changes}
+def _token_count(text: str, model: str) -> int:
+    """Number of tokens in text for the given model."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text.encode("utf-8")) // BYTES_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+# Patches are cut to this many tokens before prompting, which bounds the cost of a
+# single request regardless of how large the diff is (e.g. generated files)
+MAX_PATCH_TOKENS = 4000
+
+def _truncate_patch(patch: str, model: str, budget: int = MAX_PATCH_TOKENS) -> str:
+    """Cut a patch to at most budget tokens, marking where it was truncated."""
+    # A token covers at least one UTF-8 byte, so short patches can't be over budget
+    if len(patch.encode("utf-8")) <= budget:
+        return patch
+    encoding = _encoding(model)
+    if encoding is None:
+        data = patch.encode("utf-8")
+        if len(data) <= budget * BYTES_PER_TOKEN:
+            return patch
+        return data[:budget * BYTES_PER_TOKEN].decode("utf-8", errors="ignore") + "\n... <truncated>"
+    tokens = encoding.encode(patch, disallowed_special=())
+    if len(tokens) <= budget:
+        return patch
+    return encoding.decode(tokens[:budget]) + "\n... <truncated>"
+
+def _fallback_analysis(error: str) -> Dict:
+    """Result recorded for a file whose analysis failed."""
+    return {
+        "compatibility_testing_required": False,
+        "compatibility_analysis": {
+            "reasoning": f"Analysis failed: {error}. Unable to determine compatibility requirements.",
+            "affected_versions": {
+                "min_version": "unknown",
+                "target_versions": [],
+                "specific_apis": []
+            }
+        },
+        "compatibility_reasons": [],
+        "security_implications": [],
+        "ui_impact": {
+            "has_visual_changes": False,
+            "reasoning": "Unable to analyze UI impact due to analysis failure.",
+            "changes": []
+        },
+        "testing_recommendations": [],
+        "error": f"Analysis failed: {error}"
+    }
+
+# Result for files with no Android surface (unrecognized file type, no detected API changes),
+# which are answered without an LLM call; copy with copy.deepcopy before handing out
+_EMPTY_ANALYSIS_TEMPLATE = {
+    "compatibility_testing_required": False,
+    "compatibility_analysis": {
+        "reasoning": "No Android API surface detected in diff",
+        "affected_versions": {
+            "min_version": "N/A",
+            "target_versions": [],
+            "specific_apis": []
+        }
+    },
+    "compatibility_reasons": [],
+    "security_implications": [],
+    "ui_impact": {
+        "has_visual_changes": False,
+        "reasoning": "No Android API surface detected in diff",
+        "changes": []
+    },
+    "testing_recommendations": []
+}
+
+def _needs_llm(change: Dict) -> bool:
+    """Whether a file may have Android surface worth an LLM analysis.
+
+    Only files of an unrecognized type (not Java, Kotlin, XML or Gradle) with no
+    detected API changes are skipped; anything else, including Kotlin, manifest
+    and SDK version changes in build files, still goes to the LLM.
+    """
+    return bool(
+        change.get("file_type", "unknown") != "other"
+        or change.get("is_android_file")
+        or change.get("android_api_changes")
+    )
+
+# Instructions, rules, output schema and examples shared by every analysis request
+ANALYSIS_SYSTEM_PROMPT = """You analyze code changes from Android projects for compatibility issues and semantic changes.
 
 Your task is to:
 1. Identify any Android API changes that require compatibility testing
@@ -69,6 +152,7 @@ Pay special attention to:
 - Screen sharing protection features in Android 15+
 - Privacy-related modifications and data exposure risks
 - API version-specific features and deprecations
+- compileSdk, minSdk and targetSdk bumps and dependency upgrades in Gradle build files and version catalogs
 - Behavioral changes that might affect user experience
 
 Important: For each section, you MUST:
@@ -133,137 +217,419 @@ Format the response as JSON with the following structure (do not include any com
         }
     ]
 }"""
-        )
+
+# Per-file part of the prompt
+ANALYSIS_HUMAN_TEMPLATE = """Analyze the following code changes from file {file_name} (type: {file_type}).
+Detected Android API changes: {android_api_changes}
+
+Code changes to analyze:
+{code_changes}"""
+
+# Per-request part of the prompt when several small files are analyzed together
+MULTI_FILE_HUMAN_TEMPLATE = """Analyze the code changes of each of the following {file_count} files separately.
+
+{files}
+
+Respond with a single JSON object of the form {{"results": {{"<file name>": <analysis>}}}}, with one entry
+for every file above, keyed by its exact file name, where each <analysis> uses the JSON structure described above."""
+
+# How each file is rendered into MULTI_FILE_HUMAN_TEMPLATE
+MULTI_FILE_ENTRY_TEMPLATE = """File: {file_name} (type: {file_type})
+Detected Android API changes: {android_api_changes}
+
+Code changes to analyze:
+{code_changes}"""
+
+def _extract_json(text: str) -> Optional[str]:
+    """Return the first balanced {...} object in text, skipping braces inside JSON strings."""
+    start = text.find("{")
+    if start == -1:
+        return None
+    depth = 0
+    in_string = False
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    return None
+
+def _non_empty(value: str) -> str:
+    if not value.strip():
+        raise ValueError("Empty string not allowed")
+    return value
+
+NonEmptyStr = Annotated[str, AfterValidator(_non_empty)]
+
+class _AnalysisModel(BaseModel):
+    # Strict: types must already match (no "true" -> True coercion); extra fields are kept
+    model_config = ConfigDict(strict=True, extra="allow")
+
+class AffectedVersions(_AnalysisModel):
+    min_version: NonEmptyStr
+    target_versions: List[Any]
+    specific_apis: List[Any]
+
+class CompatibilityAnalysis(_AnalysisModel):
+    reasoning: NonEmptyStr
+    affected_versions: AffectedVersions
+
+class UIImpact(_AnalysisModel):
+    has_visual_changes: bool
+    reasoning: NonEmptyStr
+    changes: List[Any]
+
+class AnalysisResult(_AnalysisModel):
+    """Required structure of a per-file analysis returned by the LLM."""
+    compatibility_testing_required: bool
+    compatibility_analysis: CompatibilityAnalysis
+    compatibility_reasons: List[Any]
+    security_implications: List[Any]
+    ui_impact: UIImpact
+    testing_recommendations: List[Any]
+
+# Built once; validation itself runs in pydantic-core
+_VALIDATOR = TypeAdapter(AnalysisResult)
+
+class AnalysisError(Exception):
+    """Custom exception for analysis errors"""
+    pass
+
+class AnalysisService:
+    def __init__(self):
+        _load_environment()
+        
+        # Settings are read here, once .env has been loaded, not at import
+        # Chat model used for analysis; a small model is fast and cheap enough for per-file JSON reports
+        self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        # Maximum number of per-file LLM calls in flight for one commit
+        self.max_concurrency = int(os.getenv("LLM_CONCURRENCY", "8"))
+        # Small patches are combined into one request while their total stays under this many tokens;
+        # larger patches get a request of their own. Kept below MAX_PATCH_TOKENS, since patches are
+        # truncated to that before grouping and a larger budget would never leave one on its own
+        self.multi_file_token_budget = min(int(os.getenv("LLM_BATCH_TOKEN_BUDGET", "2000")), MAX_PATCH_TOKENS)
+        
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            logger.error("OpenAI API key not found in environment variables")
+            raise AnalysisError("OpenAI API key not found. Please set OPENAI_API_KEY environment variable.")
+            
+        try:
+            if not api_key:
+                raise ValueError("OpenAI API key is required")
+            
+            logger.info("Initializing ChatOpenAI with API key")
+            # One pooled HTTP/2 client for every LLM call, so concurrent analyses reuse
+            # connections instead of paying a TCP+TLS handshake each
+            self._http = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+                timeout=60
+            )
+            self.llm = ChatOpenAI(
+                model=self.model,
+                temperature=0,
+                api_key=SecretStr(api_key),
+                http_async_client=self._http,
+                # JSON mode: the response is always a single JSON object, with no surrounding prose
+                model_kwargs={"response_format": {"type": "json_object"}}
+            )
+            # Verify the LLM is properly initialized
+            if not self.llm:
+                raise ValueError("ChatOpenAI initialization failed")
+            logger.info("ChatOpenAI initialized successfully")
+        except Exception as e:
+            logger.error(f"Failed to initialize ChatOpenAI: {str(e)}")
+            raise AnalysisError(f"Failed to initialize ChatOpenAI: {str(e)}")
+        
+        # Static instructions go first so every request shares the same prompt prefix,
+        # which lets OpenAI's automatic prompt caching reuse it; only the human message varies
+        self.analysis_prompt = ChatPromptTemplate.from_messages([
+            SystemMessage(content=ANALYSIS_SYSTEM_PROMPT),
+            HumanMessagePromptTemplate.from_template(ANALYSIS_HUMAN_TEMPLATE)
+        ])
+        # Same system message, so combined requests share the cached prefix too
+        self.multi_file_prompt = ChatPromptTemplate.from_messages([
+            SystemMessage(content=ANALYSIS_SYSTEM_PROMPT),
+            HumanMessagePromptTemplate.from_template(MULTI_FILE_HUMAN_TEMPLATE)
+        ])
+        
+        # Use RunnableSequence pattern instead of deprecated LLMChain;
+        # inputs built by _multi_file_input carry "files" and take the combined prompt
+        self.analysis_chain = RunnableBranch(
+            (lambda analysis_input: "files" in analysis_input, self.multi_file_prompt),
+            self.analysis_prompt
+        ) | self.llm
+        
+        # Optional cache that answers near-duplicate patches without an LLM call;
+        # built by load_semantic_cache on first use, since loading the embedding model is slow
+        self.semantic_cache = None
+        self._semantic_cache_enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+        self._semantic_cache_lock = asyncio.Lock()
+
+    async def load_tokenizer(self) -> None:
+        """Load the tokenizer in a worker thread, so its first-use download doesn't block the event loop."""
+        await asyncio.to_thread(_encoding, self.model)
+
+    async def load_semantic_cache(self) -> None:
+        """Build the semantic cache in a worker thread, if enabled and not built yet.
+
+        Importing torch and loading (or downloading) the embedding model takes
+        seconds, which would otherwise stall every request on the event loop.
+        A failed build disables the cache instead of failing analyses.
+        """
+        if not self._semantic_cache_enabled or self.semantic_cache is not None:
+            return
+        async with self._semantic_cache_lock:
+            if not self._semantic_cache_enabled or self.semantic_cache is not None:
+                return
+            try:
+                self.semantic_cache = await asyncio.to_thread(
+                    SemanticCache,
+                    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.87")),
+                    path=os.getenv("SEMANTIC_CACHE_PATH") or None
+                )
+            except Exception as e:
+                logger.error(f"Semantic cache disabled, failed to load it: {str(e)}")
+                self._semantic_cache_enabled = False
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP connections used by the LLM client."""
+        await self._http.aclose()
+
+    def save_cache(self) -> None:
+        """Persist the semantic cache for a warm start, if it is enabled."""
+        if self.semantic_cache is not None:
+            self.semantic_cache.save()
+
+    def _analysis_input(self, change: Dict) -> Dict:
+        """Build the prompt variables for one changed file."""
+        return {
+            "file_name": change["filename"],
+            "file_type": change.get("file_type", "unknown"),
+            "code_changes": _truncate_patch(change["patch"], self.model),
+            "android_api_changes": orjson.dumps(change.get("android_api_changes", []), option=orjson.OPT_INDENT_2).decode()
+        }
+
+    @staticmethod
+    def _multi_file_input(analysis_inputs: List[Dict]) -> Dict:
+        """Build the prompt variables for a combined request covering several files."""
+        return {
+            "file_count": len(analysis_inputs),
+            "files": "\n\n---\n\n".join(
+                MULTI_FILE_ENTRY_TEMPLATE.format(**analysis_input) for analysis_input in analysis_inputs
+            )
+        }
+
+    def _request_groups(self, inputs: Dict[int, Dict], pending: List[int]) -> List[List[int]]:
+        """Group pending files into requests: small patches share one up to the token budget.
+
+        Grouping trades parallel requests for fewer sequential ones, so files are only
+        grouped when there are more of them than can run concurrently.
+        """
+        if len(pending) <= self.max_concurrency:
+            return [[index] for index in pending]
+        groups = []
+        current: List[int] = []
+        current_tokens = 0
+        for index in pending:
+            tokens = _token_count(inputs[index]["code_changes"], self.model)
+            if tokens >= self.multi_file_token_budget:
+                groups.append([index])
+                continue
+            if current and (current_tokens + tokens > self.multi_file_token_budget or len(current) >= MAX_FILES_PER_REQUEST):
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        return groups
+
+    def _multi_file_results(self, changes: List[Dict], analysis_result) -> List[Dict]:
+        """Split a combined response into per-file results; files it doesn't cover get a fallback."""
+        try:
+            if isinstance(analysis_result, Exception):
+                raise analysis_result
+            analyses = self._load_json(", ".join(change["filename"] for change in changes), analysis_result)
+            if not isinstance(analyses, dict) or not isinstance(analyses.get("results"), dict):
+                raise ValueError("Combined response has no results object")
+            analyses = analyses["results"]
+        except Exception as e:
+            return [self._file_result(change, e) for change in changes]
+        
+        results = []
+        for change in changes:
+            analysis = analyses.get(change["filename"])
+            if not isinstance(analysis, dict):
+                analysis = ValueError(f"No analysis returned for {change['filename']}")
+            results.append(self._file_result(change, analysis))
+        return results
+
+    @staticmethod
+    def _load_json(filename: str, analysis_result):
+        """Parse the JSON object in an LLM response, raising ValueError if there is none."""
+        # Get the content from the analysis result
+        if hasattr(analysis_result, 'content'):
+            analysis_text = analysis_result.content
+        else:
+            analysis_text = str(analysis_result)
+        
+        logger.debug(f"Raw analysis response for {filename}: {analysis_text}")
+        
+        analysis_text_str = analysis_text if isinstance(analysis_text, str) else str(analysis_text)
+        
+        # Try to parse as JSON
+        try:
+            return orjson.loads(analysis_text_str)
+        except orjson.JSONDecodeError as e:
+            # Try to extract JSON from the text if it's wrapped in other content
+            json_text = _extract_json(analysis_text_str)
+            if json_text is None:
+                logger.error(f"JSON parsing error for {filename}: {str(e)}")
+                raise ValueError(f"Failed to parse analysis result as JSON: {str(e)}")
+            try:
+                return orjson.loads(json_text)
+            except orjson.JSONDecodeError as e:
+                logger.error(f"JSON parsing error for {filename}: {str(e)}")
+                raise ValueError(f"Failed to parse analysis result as JSON: {str(e)}")
+
+    def _parse_analysis(self, filename: str, analysis_result) -> Dict:
+        """Parse and validate the LLM response for one file, raising ValueError if unusable."""
+        if isinstance(analysis_result, dict):
+            # Already parsed: one file's entry from a combined response
+            analysis_data = analysis_result
+        else:
+            analysis_data = self._load_json(filename, analysis_result)
         
-        # Use RunnableSequence pattern instead of deprecated LLMChain
-        self.analysis_chain = self.analysis_prompt | self.llm
+        # Validate the structure of the parsed JSON
+        try:
+            _VALIDATOR.validate_python(analysis_data)
+        except ValidationError as e:
+            details = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            )
+            logger.error(f"Invalid response structure for {filename}: {details}")
+            raise ValueError(f"Invalid response structure: {details}")
+        
+        return analysis_data
+
+    def _file_result(self, change: Dict, analysis_result) -> Dict:
+        """Pair a change with its parsed analysis, or a fallback if the call or parsing failed."""
+        try:
+            if isinstance(analysis_result, Exception):
+                raise analysis_result
+            analysis_data = self._parse_analysis(change["filename"], analysis_result)
+        except Exception as e:
+            logger.error(f"Error processing analysis for {change.get('filename', 'unknown')}: {str(e)}")
+            analysis_data = _fallback_analysis(str(e))
+        
+        # Always return a result, whether analysis succeeded or failed
+        return {
+            "filename": change.get("filename", "unknown"),
+            "analysis": analysis_data,
+            "changes": change
+        }
+
+    @staticmethod
+    def _empty_result(change: Dict) -> Dict:
+        """Result for a file without Android surface, built without calling the LLM."""
+        logger.info(f"No Android API surface in {change.get('filename', 'unknown')}, skipping LLM analysis")
+        return {
+            "filename": change.get("filename", "unknown"),
+            "analysis": copy.deepcopy(_EMPTY_ANALYSIS_TEMPLATE),
+            "changes": change
+        }
+
+    @staticmethod
+    def _analyzable_files(repo_info: Dict) -> List[Dict]:
+        """Changed files that have a patch to analyze."""
+        files = []
+        for change in repo_info.get("files", []):
+            if not change.get("patch"):
+                logger.info(f"Skipping file {change.get('filename', 'unknown')} - no patch content")
+                continue
+            files.append(change)
+        return files
 
     async def analyze_changes(self, repo_info: Dict) -> Dict:
-        """Analyze code changes using LangChain."""
+        """Analyze code changes using LangChain, batching the per-file LLM calls."""
         try:
             logger.info(f"Starting analysis for repository: {repo_info.get('repository', 'unknown')}")
-            results = []
+            files = self._analyzable_files(repo_info)
+            await self.load_tokenizer()
+            await self.load_semantic_cache()
             
-            for change in repo_info.get("files", []):
-                if not change.get("patch"):
-                    logger.info(f"Skipping file {change.get('filename', 'unknown')} - no patch content")
-                    continue
-                    
-                logger.info(f"Analyzing file: {change.get('filename', 'unknown')}")
-                
-                analysis_data = None
+            results: List[Optional[Dict]] = [
+                None if _needs_llm(change) else self._empty_result(change) for change in files
+            ]
+            # Prompt inputs only for files that go to the LLM (or the semantic cache)
+            inputs = {
+                index: self._analysis_input(change)
+                for index, change in enumerate(files) if results[index] is None
+            }
+            
+            vectors = {}
+            if self.semantic_cache is not None:
+                lookups = [index for index, result in enumerate(results) if result is None]
+                # Embedding is CPU-bound, so keep it off the event loop
+                embedded = await asyncio.to_thread(self.semantic_cache.embed, [inputs[index] for index in lookups])
+                for index, vector in zip(lookups, embedded):
+                    vectors[index] = vector
+                    cached = self.semantic_cache.lookup(vector)
+                    if cached is not None:
+                        logger.info(f"Semantic cache hit for {files[index]['filename']}")
+                        results[index] = {
+                            "filename": files[index]["filename"],
+                            "analysis": cached,
+                            "changes": files[index]
+                        }
+            
+            pending = [index for index, result in enumerate(results) if result is None]
+            if pending:
+                # Small patches share a request; the shared instructions are then paid for once per group
                 try:
-                    # Prepare input for analysis
-                    analysis_input = {
-                        "file_name": change["filename"],
-                        "file_type": change.get("file_type", "unknown"),
-                        "code_changes": change["patch"],
-                        "android_api_changes": json.dumps(change.get("android_api_changes", []), indent=2)
-                    }
-                    
-                    # Run analysis with new RunnableSequence pattern
-                    logger.info(f"Running analysis for {change['filename']}")
-                    analysis_result = await self.analysis_chain.ainvoke(analysis_input)
-                    
-                    # Get the content from the analysis result
-                    if hasattr(analysis_result, 'content'):
-                        analysis_text = analysis_result.content
-                    else:
-                        analysis_text = str(analysis_result)
-                    
-                    logger.debug(f"Raw analysis response for {change['filename']}: {analysis_text}")
-                    
-                    # Try to parse as JSON
-                    try:
-                        if isinstance(analysis_text, (str, bytes, bytearray)):
-                            analysis_data = json.loads(analysis_text)
-                        else:
-                            analysis_text_str = str(analysis_text)
-                            # Try to extract JSON from the text if it's wrapped in other content
-                            json_match = re.search(r'\{.*\}', analysis_text_str, re.DOTALL)
-                            if json_match:
-                                analysis_data = json.loads(json_match.group(0))
-                            else:
-                                logger.error(f"Failed to parse JSON for {change['filename']}: {analysis_text_str}")
-                                raise ValueError("Failed to parse analysis result as JSON")
-                    except (json.JSONDecodeError, TypeError) as e:
-                        logger.error(f"JSON parsing error for {change['filename']}: {str(e)}")
-                        raise ValueError(f"Failed to parse analysis result as JSON: {str(e)}")
-                    
-                    # Validate the structure of the parsed JSON
-                    required_fields = {
-                        "compatibility_testing_required": bool,
-                        "compatibility_analysis": {
-                            "reasoning": str,
-                            "affected_versions": {
-                                "min_version": str,
-                                "target_versions": list,
-                                "specific_apis": list
-                            }
-                        },
-                        "compatibility_reasons": list,
-                        "security_implications": list,
-                        "ui_impact": {
-                            "has_visual_changes": bool,
-                            "reasoning": str,
-                            "changes": list
-                        },
-                        "testing_recommendations": list
-                    }
-                    
-                    def validate_field(data, schema, path=""):
-                        if isinstance(schema, dict):
-                            if not isinstance(data, dict):
-                                raise ValueError(f"Expected dict at {path}, got {type(data)}")
-                            for key, subschema in schema.items():
-                                if key not in data: 
-                                    raise ValueError(f"Missing required field: {path + '.' if path else ''}{key}")
-                                validate_field(data[key], subschema, f"{path + '.' if path else ''}{key}")
-                        elif isinstance(schema, type):
-                            if not isinstance(data, schema):
-                                raise ValueError(f"Invalid type for {path}: expected {schema}, got {type(data)}")
-                            # Validate non-empty strings
-                            if schema == str and not data.strip():
-                                raise ValueError(f"Empty string not allowed for {path}")
-                        elif schema == list:
-                            if not isinstance(data, list):
-                                raise ValueError(f"Expected list at {path}, got {type(data)}")
-                    
-                    try:
-                        validate_field(analysis_data, required_fields)
-                    except ValueError as e:
-                        logger.error(f"Invalid response structure for {change['filename']}: {str(e)}")
-                        raise ValueError(f"Invalid response structure: {str(e)}")
-                        
+                    groups = self._request_groups(inputs, pending)
                 except Exception as e:
-                    logger.error(f"Error processing analysis for {change['filename']}: {str(e)}")
-                    analysis_data = {
-                        "compatibility_testing_required": False,
-                        "compatibility_analysis": {
-                            "reasoning": f"Analysis failed: {str(e)}. Unable to determine compatibility requirements.",
-                            "affected_versions": {
-                                "min_version": "unknown",
-                                "target_versions": [],
-                                "specific_apis": []
-                            }
-                        },
-                        "compatibility_reasons": [],
-                        "security_implications": [],
-                        "ui_impact": {
-                            "has_visual_changes": False,
-                            "reasoning": "Unable to analyze UI impact due to analysis failure.",
-                            "changes": []
-                        },
-                        "testing_recommendations": [],
-                        "error": f"Analysis failed: {str(e)}"
-                    }
+                    # Grouping is only an optimization; one request per file still works
+                    logger.warning(f"Grouping files failed, sending one request per file: {str(e)}")
+                    groups = [[index] for index in pending]
                 
-                # Always append results, whether analysis succeeded or failed
-                results.append({
-                    "filename": change["filename"],
-                    "analysis": analysis_data,
-                    "changes": change
-                })
+                # One batched Runnable call; LangChain runs the requests concurrently up to the cap
+                logger.info(f"Running analysis for {len(pending)} files in {len(groups)} requests")
+                outputs = await self.analysis_chain.abatch(
+                    [
+                        inputs[group[0]] if len(group) == 1
+                        else self._multi_file_input([inputs[index] for index in group])
+                        for group in groups
+                    ],
+                    config={"max_concurrency": self.max_concurrency},
+                    return_exceptions=True
+                )
+                
+                # A file whose call failed still gets a result, so one failure doesn't discard the rest
+                for group, output in zip(groups, outputs):
+                    if len(group) == 1:
+                        group_results = [self._file_result(files[group[0]], output)]
+                    else:
+                        group_results = self._multi_file_results([files[index] for index in group], output)
+                    for index, result in zip(group, group_results):
+                        results[index] = result
+                        if index in vectors and "error" not in result["analysis"]:
+                            self.semantic_cache.insert(vectors[index], result["analysis"])
             
             return {
                 "repository": repo_info["repository"],
@@ -274,3 +640,81 @@ Format the response as JSON with the following structure (do not include any com
         except Exception as e:
             logger.error(f"Analysis process failed: {str(e)}")
             raise AnalysisError(f"Analysis process failed: {str(e)}")
+
+    async def stream_changes(self, repo_info: Dict) -> AsyncIterator[Dict]:
+        """Analyze code changes, yielding response tokens as they arrive.
+
+        Yields {"event": "delta", "filename", "delta"} for each streamed chunk,
+        {"event": "file", ...} with the parsed result once a file's response is
+        complete, and finally {"event": "complete", "repository", "commit", "files"}
+        with the same result analyze_changes would return. If a file's response
+        takes longer than STREAM_FILE_TIMEOUT, a final {"event": "error", "detail"}
+        is yielded instead of "complete".
+        """
+        logger.info(f"Starting streamed analysis for repository: {repo_info.get('repository', 'unknown')}")
+        files = self._analyzable_files(repo_info)
+        await self.load_tokenizer()
+        results: List[Optional[Dict]] = [None] * len(files)
+        events: "asyncio.Queue[Dict]" = asyncio.Queue()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def stream_file(index: int, change: Dict) -> None:
+            if not _needs_llm(change):
+                results[index] = self._empty_result(change)
+                await events.put({"event": "file", **results[index]})
+                return
+            async with semaphore:
+                buffer = ""
+                
+                async def consume() -> None:
+                    nonlocal buffer
+                    async for chunk in self.analysis_chain.astream(self._analysis_input(change)):
+                        buffer += chunk.content
+                        await events.put({"event": "delta", "filename": change["filename"], "delta": chunk.content})
+                
+                try:
+                    await asyncio.wait_for(consume(), timeout=STREAM_FILE_TIMEOUT)
+                    analysis_result = buffer
+                except asyncio.TimeoutError:
+                    await events.put({
+                        "event": "error",
+                        "detail": f"Analysis of {change['filename']} timed out. Please try again with a smaller commit."
+                    })
+                    return
+                except Exception as e:
+                    analysis_result = e
+                # The JSON is only parsed and validated once the response is complete
+                results[index] = self._file_result(change, analysis_result)
+                await events.put({"event": "file", **results[index]})
+        
+        # Files stream concurrently, up to the same cap as the batched path
+        tasks = [asyncio.create_task(stream_file(index, change)) for index, change in enumerate(files)]
+        try:
+            remaining = len(files)
+            while remaining:
+                event = await events.get()
+                yield event
+                if event["event"] == "error":
+                    # A stalled file ends the stream; the finally below cancels the rest
+                    return
+                if event["event"] == "file":
+                    remaining -= 1
+        finally:
+            # Stop outstanding calls if the consumer goes away mid-stream
+            for task in tasks:
+                task.cancel()
+        
+        yield {
+            "event": "complete",
+            "repository": repo_info["repository"],
+            "commit": repo_info["commit"],
+            "files": results
+        }
+
+@functools.lru_cache(maxsize=1)
+def get_analysis_service() -> AnalysisService:
+    """Process-wide AnalysisService, so the ChatOpenAI client is built once.
+
+    A failed construction is not cached and is retried on the next call.
+    """
+    return AnalysisService()
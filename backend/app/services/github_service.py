@@ -1,20 +1,57 @@
-from github import Github
-from github.GithubException import GithubException, RateLimitExceededException
 from typing import List, Dict, Optional
+from cachetools import LRUCache
+import asyncio
+import functools
+import time
+import httpx
 import re
 from dotenv import load_dotenv
 import os
 
-# Load environment variables
-load_dotenv()
+@functools.lru_cache(maxsize=1)
+def _load_environment() -> None:
+    """Load .env once per process, on first service construction rather than at import."""
+    load_dotenv()
+
+# Android API calls worth flagging, in reporting order
+_ANDROID_API_DESCRIPTIONS = {
+    "setPublicVersion": "Android 15 - Screen sharing protection",
+    "setContentSensitivity": "Android 15 - Content sensitivity",
+    "setVisibility": "Notification visibility",
+    "setCategory": "Notification category",
+}
+
+# One pass over the patch finds all of them; visibility and category only count
+# when called with a NotificationCompat constant
+_ANDROID_API_REGEX = re.compile(
+    r"\.(setPublicVersion|setContentSensitivity"
+    r"|setVisibility(?=\s*\(\s*NotificationCompat\.VISIBILITY_)"
+    r"|setCategory(?=\s*\(\s*NotificationCompat\.CATEGORY_))\s*\("
+)
+
+GITHUB_API_URL = "https://api.github.com"
+
+# https://github.com/{owner}/{repo}/commit/{sha}
+_COMMIT_URL_RE = re.compile(r"https://github\.com/([^/]+)/([^/]+)/commit/([a-f0-9]+)")
+
+# Gradle build scripts (Groovy and Kotlin DSL), version catalogs and Gradle properties
+GRADLE_FILE_SUFFIXES = (".gradle", ".gradle.kts", ".versions.toml", "gradle.properties")
+
+# Fields kept from each file in GitHub's commit response
+_COMMIT_FILE_FIELDS = ("filename", "status", "additions", "deletions", "changes", "patch")
 
 class GitHubError(Exception):
     """Custom exception for GitHub-related errors"""
     pass
 
+class GitHubRateLimitError(GitHubError):
+    """GitHub rejected a request because the rate limit is exhausted"""
+    pass
+
 class GitHubService:
     def __init__(self):
         """Initialize GitHub service with token from environment."""
+        _load_environment()
         # Use GITHUB_TOKEN for authentication
         token = os.getenv("GITHUB_TOKEN")
         if not token:
@@ -24,119 +61,183 @@ class GitHubService:
         if not token.startswith(('ghp_', 'github_pat_')):
             raise GitHubError("Invalid token format. Token must start with 'ghp_' or 'github_pat_'")
             
-        # Initialize GitHub client with token
-        try:
-            print(f"Initializing GitHub client with token starting with: {token[:4]}...")
-            self.github = Github(token)
+        # Fetched commits are reused for this many seconds; past that they are refetched,
+        # but still served if GitHub is rate limiting us
+        self._commit_cache_ttl = float(os.getenv("GITHUB_COMMIT_CACHE_TTL", "86400"))
+        # Commits are immutable, so raw commit files are cached by (owner, repo, commit hash)
+        # as (fetched_at, files); derived fields such as Android API changes are rebuilt per call
+        self._commit_cache = LRUCache(maxsize=1024)
             
-            # Test token validity with user info
-            print("Testing token validity...")
-            user = self.github.get_user()
-            rate_limit = self.github.get_rate_limit()
+        # Shared async client: HTTP/2 multiplexes calls over one kept-alive connection,
+        # and GitHub I/O no longer blocks the event loop
+        print(f"Initializing GitHub client with token starting with: {token[:4]}...")
+        self._client = httpx.AsyncClient(
+            base_url=GITHUB_API_URL,
+            headers={
+                "Authorization": f"Bearer {token}",
+                "Accept": "application/vnd.github+json",
+                "X-GitHub-Api-Version": "2022-11-28"
+            },
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+            timeout=30
+        )
+        
+        # The token is checked against /user on first use rather than at construction
+        self._token_validated = False
+        self._validate_lock = asyncio.Lock()
+
+    async def _validate_token(self) -> None:
+        """Check the token with GET /user once, before the first API call."""
+        if self._token_validated:
+            return
+        async with self._validate_lock:
+            if self._token_validated:
+                return
+            try:
+                print("Testing token validity...")
+                response = await self._client.get("/user")
+            except httpx.HTTPError as e:
+                raise GitHubError(f"Failed to initialize GitHub client: {str(e)}")
+            if response.status_code == 401:
+                raise GitHubError(f"Invalid token format or expired token. Please check GITHUB_TOKEN value.")
+            elif response.status_code == 403:
+                raise GitHubError(f"Token lacks required permissions: {response.text}")
+            elif response.is_error:
+                raise GitHubError(f"GitHub API error: {response.status_code} {response.text}")
             
             print(f"GitHub API initialized successfully!")
-            print(f"Authenticated as: {user.login}")
-            print(f"Rate limit: {rate_limit.core.remaining}/{rate_limit.core.limit}")
-        except GithubException as e:
-            if e.status == 401:
-                raise GitHubError(f"Invalid token format or expired token. Please check GITHUB_TOKEN value.")
-            elif e.status == 403:
-                raise GitHubError(f"Token lacks required permissions: {str(e)}")
-            else:
-                raise GitHubError(f"GitHub API error: {str(e)}")
-        except Exception as e:
-            raise GitHubError(f"Failed to initialize GitHub client: {str(e)}")
+            print(f"Authenticated as: {response.json().get('login')}")
+            print(f"Rate limit: {response.headers.get('x-ratelimit-remaining')}/{response.headers.get('x-ratelimit-limit')}")
+            self._token_validated = True
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP connections."""
+        await self._client.aclose()
 
     def _detect_android_api_changes(self, patch: str) -> List[Dict[str, str]]:
         """Detect Android API changes in the patch."""
         if not patch:
             return []
             
-        api_changes = []
-        android_api_patterns = [
-            (r'\.setPublicVersion\s*\(', 'Android 15 - Screen sharing protection'),
-            (r'\.setContentSensitivity\s*\(', 'Android 15 - Content sensitivity'),
-            (r'\.setVisibility\s*\(\s*NotificationCompat\.VISIBILITY_', 'Notification visibility'),
-            (r'\.setCategory\s*\(\s*NotificationCompat\.CATEGORY_', 'Notification category')
+        found = {match.group(1) for match in _ANDROID_API_REGEX.finditer(patch)}
+        api_changes = [
+            {"api": api, "description": description}
+            for api, description in _ANDROID_API_DESCRIPTIONS.items()
+            if api in found
         ]
-        
-        for pattern, description in android_api_patterns:
-            if re.search(pattern, patch):
-                api_changes.append({
-                    "api": pattern.split(r'\.')[-1].split(r'\(')[0],
-                    "description": description
-                })
-                
         return api_changes
 
-    def parse_commit_url(self, url: str) -> Optional[Dict[str, str]]:
+    @staticmethod
+    def parse_commit_url(url: str) -> Optional[Dict[str, str]]:
         """Parse GitHub commit URL to extract owner, repo, and commit hash."""
-        pattern = r"https://github\.com/([^/]+)/([^/]+)/commit/([a-f0-9]+)"
-        match = re.match(pattern, url)
+        match = _COMMIT_URL_RE.match(url)
         
         if not match:
             return None
             
         return {
-            "owner": match.group(1),
-            "repo": match.group(2),
-            "commit_hash": match.group(3)
+            "owner": match[1],
+            "repo": match[2],
+            "commit_hash": match[3]
         }
 
-    def get_commit_changes(self, url: str) -> Dict:
+    async def _fetch_commit_files(self, owner: str, repo: str, commit_hash: str) -> List[Dict]:
+        """Fetch a commit's changed files from GET /repos/{owner}/{repo}/commits/{sha}."""
+        files = []
+        url = f"/repos/{owner}/{repo}/commits/{commit_hash}"
+        # One page holds up to 300 files; larger commits continue on the Link: rel="next" pages
+        while url:
+            response = await self._client.get(url)
+            if response.status_code == 429 or (
+                response.status_code == 403 and response.headers.get("x-ratelimit-remaining") == "0"
+            ):
+                raise GitHubRateLimitError("GitHub API rate limit exceeded. Please try again later.")
+            if response.is_error:
+                raise GitHubError(f"GitHub API error: {response.status_code} {response.text}")
+            files.extend(
+                {field: file.get(field) for field in _COMMIT_FILE_FIELDS}
+                for file in response.json().get("files", [])
+                # Skip binary files and files without patches
+                if file.get("patch")
+            )
+            url = response.links.get("next", {}).get("url")
+        return files
+
+    async def _get_commit_files(self, owner: str, repo: str, commit_hash: str) -> List[Dict]:
+        """Return a commit's files from the cache, fetching them when missing or expired."""
+        cache_key = (owner, repo, commit_hash)
+        cached = self._commit_cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached[0] < self._commit_cache_ttl:
+            return cached[1]
+
+        try:
+            await self._validate_token()
+            files = await self._fetch_commit_files(owner, repo, commit_hash)
+        except GitHubRateLimitError:
+            # The commit can't have changed, so an expired copy beats failing the request
+            if cached is not None:
+                print(f"GitHub rate limit exceeded, serving cached commit {commit_hash}")
+                return cached[1]
+            raise
+        self._commit_cache[cache_key] = (time.monotonic(), files)
+        return files
+
+    def _build_file_change(self, file: Dict) -> Dict:
+        """Describe one changed file, detecting its type and any Android API changes."""
+        filename = file["filename"]
+        
+        # Detect file type and Android-specific files
+        file_type = (
+            'java' if filename.endswith('.java')
+            else 'kotlin' if filename.endswith('.kt')
+            else 'xml' if filename.endswith('.xml')
+            # Build scripts and version catalogs carry the compileSdk/minSdk/targetSdk and dependency bumps
+            else 'gradle' if filename.endswith(GRADLE_FILE_SUFFIXES)
+            else 'other'
+        )
+        
+        is_android_file = file_type != 'other' and (
+            '/android/' in filename.lower() or
+            'app/src/main' in filename or
+            filename.endswith('AndroidManifest.xml')
+        )
+        
+        return {
+            **file,
+            "is_android_file": is_android_file,
+            "file_type": file_type,
+            # Detection is cheap and API calls can appear outside the recognized source layouts
+            "android_api_changes": self._detect_android_api_changes(file["patch"])
+        }
+
+    async def get_commit_changes(self, url: str) -> Dict:
         """Get the changes from a specific commit."""
         try:
             parsed = self.parse_commit_url(url)
             if not parsed:
                 raise GitHubError("Invalid GitHub commit URL format")
 
-            repo = self.github.get_repo(f"{parsed['owner']}/{parsed['repo']}")
-            commit = repo.get_commit(parsed['commit_hash'])
+            commit_files = await self._get_commit_files(parsed['owner'], parsed['repo'], parsed['commit_hash'])
             
             # Get repository and commit information
-            repo_info = {
+            return {
                 "repository": f"{parsed['owner']}/{parsed['repo']}",
                 "commit": parsed['commit_hash'],
-                "files": []
+                "files": [self._build_file_change(file) for file in commit_files]
             }
-            changes = []
-            for file in commit.files:
-                # Skip binary files and files without patches
-                if not file.patch:
-                    continue
-                    
-                # Detect file type and Android-specific files
-                is_android_file = (
-                    file.filename.endswith('.java') and
-                    ('/android/' in file.filename.lower() or
-                    'app/src/main' in file.filename)
-                )
-                
-                file_type = (
-                    'java' if file.filename.endswith('.java')
-                    else 'kotlin' if file.filename.endswith('.kt')
-                    else 'xml' if file.filename.endswith('.xml')
-                    else 'other'
-                )
-                
-                changes.append({
-                    "filename": file.filename,
-                    "status": file.status,
-                    "additions": file.additions,
-                    "deletions": file.deletions,
-                    "changes": file.changes,
-                    "patch": file.patch,
-                    "is_android_file": is_android_file,
-                    "file_type": file_type,
-                    "android_api_changes": self._detect_android_api_changes(file.patch) if is_android_file else []
-                })
             
-            repo_info["files"] = changes
-            return repo_info
-            
-        except RateLimitExceededException:
-            raise GitHubError("GitHub API rate limit exceeded. Please try again later.")
-        except GithubException as e:
+        except GitHubError:
+            raise
+        except httpx.HTTPError as e:
             raise GitHubError(f"GitHub API error: {str(e)}")
         except Exception as e:
             raise GitHubError(f"Error fetching commit changes: {str(e)}")
+
+@functools.lru_cache(maxsize=1)
+def get_github_service() -> GitHubService:
+    """Process-wide GitHubService, so its connection pool is shared by all requests.
+
+    A failed construction is not cached and is retried on the next call.
+    """
+    return GitHubService()
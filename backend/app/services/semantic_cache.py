@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import copy
+import logging
+import os
+import uuid
+
+import numpy as np
+import orjson
+
+logger = logging.getLogger(__name__)
+
+class SemanticCache:
+    """LRU cache of per-file analysis results, matched by embedding similarity.
+
+    Each entry pairs a normalized embedding of the analyzed input with the validated
+    analysis it produced. A lookup returns the stored analysis of the most similar
+    entry when its cosine similarity reaches the threshold.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        threshold: float = 0.87,
+        maxsize: int = 1024,
+        path: Optional[str] = None
+    ):
+        # Imported here so the embedding model (and torch) only load when the cache is enabled
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.path = path
+        self._entries: "OrderedDict[str, Tuple[np.ndarray, Dict]]" = OrderedDict()
+        if path and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def cache_text(analysis_input: Dict) -> str:
+        """Text embedded for a prompt input: file type, patch and detected API changes."""
+        return (
+            f"{analysis_input['file_type']}\n"
+            f"{analysis_input['code_changes']}\n"
+            f"{analysis_input['android_api_changes']}"
+        )
+
+    def embed(self, analysis_inputs: List[Dict]) -> np.ndarray:
+        """Embed prompt inputs as unit vectors, one row per input."""
+        texts = [self.cache_text(analysis_input) for analysis_input in analysis_inputs]
+        return np.asarray(self.model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    def lookup(self, vector: np.ndarray) -> Optional[Dict]:
+        """Return a copy of the closest cached analysis, or None below the threshold."""
+        if not self._entries:
+            return None
+        keys = list(self._entries)
+        vectors = np.stack([entry[0] for entry in self._entries.values()])
+        # Rows are unit vectors, so the dot product is the cosine similarity
+        similarities = vectors @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        key = keys[best]
+        self._entries.move_to_end(key)
+        return copy.deepcopy(self._entries[key][1])
+
+    def insert(self, vector: np.ndarray, analysis: Dict) -> None:
+        """Store an analysis, evicting the least recently used entry when full."""
+        self._entries[uuid.uuid4().hex] = (vector, analysis)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def save(self) -> None:
+        """Write the cache to `path` for a warm start."""
+        if not self.path:
+            return
+        payload = {
+            "vectors": np.stack([entry[0] for entry in self._entries.values()]) if self._entries else [],
+            "analyses": [entry[1] for entry in self._entries.values()]
+        }
+        with open(self.path, "wb") as f:
+            f.write(orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY))
+        logger.info(f"Saved {len(self._entries)} semantic cache entries to {self.path}")
+
+    def load(self) -> None:
+        """Load entries previously written by save()."""
+        try:
+            with open(self.path, "rb") as f:
+                payload = orjson.loads(f.read())
+            for vector, analysis in zip(payload["vectors"], payload["analyses"]):
+                self.insert(np.asarray(vector, dtype=np.float32), analysis)
+            logger.info(f"Loaded {len(self._entries)} semantic cache entries from {self.path}")
+        except Exception as e:
+            logger.error(f"Failed to load semantic cache from {self.path}: {str(e)}")
@@ -13,13 +13,13 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from app.db.models import Base, HistoryRecordDB  # Import the model explicitly
-from app.db.database import DATABASE_URL, MYSQL_USER, MYSQL_PASSWORD, MYSQL_HOST, MYSQL_PORT, MYSQL_DATABASE
+from app.db.database import SYNC_DATABASE_URL
 
 # Load environment variables
 load_dotenv()
 
-# Override DATABASE_URL with environment variables
-DATABASE_URL = f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
+# Migrations run synchronously, so use the sync driver URL built from environment variables
+DATABASE_URL = SYNC_DATABASE_URL
 
 print("Initializing Alembic with database URL:", DATABASE_URL)
 
@@ -76,10 +76,17 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    # Same environment-built URL as offline mode, not the placeholder in alembic.ini
+    configuration = config.get_section(config.config_ini_section, {})
+    configuration["sqlalchemy.url"] = DATABASE_URL
     connectable = engine_from_config(
-        config.get_section(config.config_ini_section, {}),
+        configuration,
         prefix="sqlalchemy.",
-        poolclass=pool.NullPool,
+        # Exactly one pooled connection for the whole run, checked before use
+        poolclass=pool.QueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_pre_ping=True,
     )
 
     with connectable.connect() as connection:
@@ -0,0 +1,29 @@
+"""add history timestamp desc index
+
+Revision ID: 1081be20e097
+Revises: d3d11144457c
+Create Date: 2026-10-14 05:45:12.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1081be20e097'
+down_revision: Union[str, None] = 'd3d11144457c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Descending index replaces the ascending idx_timestamp for ORDER BY timestamp DESC
+    op.create_index("ix_history_timestamp_desc", "history_records", [sa.text("timestamp DESC")])
+    op.drop_index("idx_timestamp", "history_records")
+
+
+def downgrade() -> None:
+    op.create_index("idx_timestamp", "history_records", ["timestamp"])
+    op.drop_index("ix_history_timestamp_desc", "history_records")
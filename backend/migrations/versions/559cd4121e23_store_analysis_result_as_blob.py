@@ -0,0 +1,88 @@
+"""store analysis result as blob
+
+Revision ID: 559cd4121e23
+Revises: 5f99b8c5f5ca
+Create Date: 2026-10-14 05:54:41.930266
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+import zstandard
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '559cd4121e23'
+down_revision: Union[str, None] = '5f99b8c5f5ca'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows are decompressed this many at a time during downgrade
+DOWNGRADE_BATCH_SIZE = 500
+
+
+def upgrade() -> None:
+    # MySQL converts JSON to its UTF-8 text form, which orjson reads back unchanged
+    op.alter_column(
+        "history_records",
+        "analysis_result",
+        type_=mysql.LONGBLOB(),
+        existing_type=sa.JSON(),
+        existing_nullable=False,
+        comment="Complete analysis results as orjson-encoded JSON",
+        existing_comment="Complete analysis results in JSON format",
+    )
+
+
+def downgrade() -> None:
+    if context.is_offline_mode():
+        # Compressed rows have to be read and rewritten in Python, which --sql can't emit
+        raise NotImplementedError("Downgrading 559cd4121e23 needs a database connection; run it online")
+    
+    # Values written by the application are zstd frames; JSON can only be built from the
+    # plain text, so decompress them in place first (rows stored before compression are already text)
+    bind = op.get_bind()
+    history = sa.table(
+        "history_records",
+        sa.column("aid", sa.CHAR(32)),
+        sa.column("analysis_result", mysql.LONGBLOB()),
+    )
+    compressed = [
+        row.aid for row in bind.execute(
+            sa.select(history.c.aid).where(sa.func.substr(history.c.analysis_result, 1, 4) == b"\x28\xb5\x2f\xfd")
+        )
+    ]
+    decompressor = zstandard.ZstdDecompressor()
+    for start in range(0, len(compressed), DOWNGRADE_BATCH_SIZE):
+        aids = compressed[start:start + DOWNGRADE_BATCH_SIZE]
+        rows = bind.execute(
+            sa.select(history.c.aid, history.c.analysis_result).where(history.c.aid.in_(aids))
+        ).all()
+        bind.execute(
+            history.update().where(history.c.aid == sa.bindparam("b_aid")),
+            [
+                {"b_aid": row.aid, "analysis_result": decompressor.decompress(row.analysis_result)}
+                for row in rows
+            ],
+        )
+    
+    # MySQL won't build JSON from a binary string, so go through utf8mb4 text
+    op.alter_column(
+        "history_records",
+        "analysis_result",
+        type_=mysql.LONGTEXT(charset="utf8mb4", collation="utf8mb4_bin"),
+        existing_type=mysql.LONGBLOB(),
+        existing_nullable=False,
+        existing_comment="Complete analysis results as orjson-encoded JSON",
+    )
+    op.alter_column(
+        "history_records",
+        "analysis_result",
+        type_=sa.JSON(),
+        existing_type=mysql.LONGTEXT(charset="utf8mb4", collation="utf8mb4_bin"),
+        existing_nullable=False,
+        comment="Complete analysis results in JSON format",
+        existing_comment="Complete analysis results as orjson-encoded JSON",
+    )
@@ -0,0 +1,37 @@
+"""add history repository timestamp index
+
+Revision ID: 5edf2b88de37
+Revises: 559cd4121e23
+Create Date: 2026-10-14 06:31:08.552914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5edf2b88de37'
+down_revision: Union[str, None] = '559cd4121e23'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A repository's records newest first come straight off this index, without a filesort
+    op.create_index(
+        "ix_history_repository_timestamp_desc",
+        "history_records",
+        ["repository", sa.text("timestamp DESC")]
+    )
+    # repository is the leading column of both composites, and commit lookups always
+    # filter on repository too, so ix_history_repository_commit serves them
+    op.drop_index("idx_repository", "history_records")
+    op.drop_index("idx_commit", "history_records")
+
+
+def downgrade() -> None:
+    op.create_index("idx_commit", "history_records", ["commit_hash"])
+    op.create_index("idx_repository", "history_records", ["repository"])
+    op.drop_index("ix_history_repository_timestamp_desc", "history_records")
@@ -0,0 +1,48 @@
+"""shorten history aid to uuid hex
+
+Revision ID: 5f99b8c5f5ca
+Revises: 81310cbab48c
+Create Date: 2026-10-14 05:52:08.114705
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f99b8c5f5ca'
+down_revision: Union[str, None] = '81310cbab48c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Strip dashes from existing UUIDs so they fit the 32-character hex form
+    op.execute("UPDATE history_records SET aid = REPLACE(aid, '-', '')")
+    op.alter_column(
+        "history_records",
+        "aid",
+        type_=sa.CHAR(length=32),
+        existing_type=sa.String(length=36),
+        existing_nullable=False,
+        comment="Unique identifier for the analysis record (UUID hex)",
+        existing_comment="Unique identifier for the analysis record",
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        "history_records",
+        "aid",
+        type_=sa.String(length=36),
+        existing_type=sa.CHAR(length=32),
+        existing_nullable=False,
+        comment="Unique identifier for the analysis record",
+        existing_comment="Unique identifier for the analysis record (UUID hex)",
+    )
+    op.execute(
+        "UPDATE history_records SET aid = CONCAT_WS('-', SUBSTR(aid, 1, 8), SUBSTR(aid, 9, 4), "
+        "SUBSTR(aid, 13, 4), SUBSTR(aid, 17, 4), SUBSTR(aid, 21, 12))"
+    )
@@ -0,0 +1,26 @@
+"""add history repository commit index
+
+Revision ID: 81310cbab48c
+Revises: 1081be20e097
+Create Date: 2026-10-14 05:49:37.602114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '81310cbab48c'
+down_revision: Union[str, None] = '1081be20e097'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_history_repository_commit", "history_records", ["repository", "commit_hash"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_history_repository_commit", "history_records")
@@ -0,0 +1,35 @@
+"""order history index by timestamp and aid
+
+Revision ID: b7e3c1d9a4f2
+Revises: 5edf2b88de37
+Create Date: 2026-10-14 06:52:37.104518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3c1d9a4f2'
+down_revision: Union[str, None] = '5edf2b88de37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The history listing orders by timestamp DESC, aid DESC. InnoDB appends the primary key
+    # to ix_history_timestamp_desc in ascending order, which matches neither scan direction,
+    # so aid has to be an explicit descending key part
+    op.create_index(
+        "ix_history_timestamp_aid_desc",
+        "history_records",
+        [sa.text("timestamp DESC"), sa.text("aid DESC")]
+    )
+    op.drop_index("ix_history_timestamp_desc", "history_records")
+
+
+def downgrade() -> None:
+    op.create_index("ix_history_timestamp_desc", "history_records", [sa.text("timestamp DESC")])
+    op.drop_index("ix_history_timestamp_aid_desc", "history_records")
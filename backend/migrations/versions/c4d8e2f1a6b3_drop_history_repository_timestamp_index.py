@@ -0,0 +1,32 @@
+"""drop history repository timestamp index
+
+Revision ID: c4d8e2f1a6b3
+Revises: b7e3c1d9a4f2
+Create Date: 2026-10-14 07:04:19.663027
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d8e2f1a6b3'
+down_revision: Union[str, None] = 'b7e3c1d9a4f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # No query filters by repository and orders by timestamp, so the index only added
+    # write cost; commit lookups are served by ix_history_repository_commit
+    op.drop_index("ix_history_repository_timestamp_desc", "history_records")
+
+
+def downgrade() -> None:
+    op.create_index(
+        "ix_history_repository_timestamp_desc",
+        "history_records",
+        ["repository", sa.text("timestamp DESC")]
+    )
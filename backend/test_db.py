@@ -1,26 +1,24 @@
 import asyncio
-from app.db.database import check_db_connection, DATABASE_URL, SessionLocal
-import uvicorn
-import requests
-import time
+import os
 import sys
-from multiprocessing import Process
 from datetime import datetime
 import uuid
-from app.db.models import HistoryRecordDB
+from typing import List
 
-def run_server():
-    """Run the FastAPI server for testing."""
-    import os
-    os.environ["GITHUB_TOKEN"] = "ghp_dummy"  # Set dummy token to prevent GitHub service initialization
-    uvicorn.run("app.main:app", host="127.0.0.1", port=8000, log_level="error")
+# Set dummy token before importing the app, to prevent GitHub service initialization failures
+os.environ.setdefault("GITHUB_TOKEN", "ghp_dummy")
 
-def create_test_record():
-    """Create a test record in the database."""
-    db = SessionLocal()
-    try:
-        test_record = HistoryRecordDB(
-            aid=str(uuid.uuid4()),
+from fastapi.testclient import TestClient
+from app.db.database import check_db_connection, DATABASE_URL, engine
+from app.db.history_writer import write_batch
+from app.db.models import HistoryRecordDB
+from app.main import app
+
+async def create_test_records(count: int = 3) -> List[str]:
+    """Create test records in the database with one multi-row INSERT."""
+    test_records = [
+        HistoryRecordDB(
+            aid=uuid.uuid4().hex,
             timestamp=datetime.utcnow(),
             repository="test/repo",
             commit_hash="abc123",
@@ -28,53 +26,57 @@ def create_test_record():
             status="completed",
             notes="Test record"
         )
-        db.add(test_record)
-        db.commit()
-        return test_record.aid
+        for _ in range(count)
+    ]
+    # Same single-session, single-commit bulk path the app's history writer uses
+    await write_batch(test_records)
+    return [test_record.aid for test_record in test_records]
+
+async def prepare_database() -> List[str]:
+    """Check the connection and create test records on one event loop."""
+    try:
+        print("Testing database connection with configured environment variables...")
+        connection_result = await check_db_connection()
+        print(f"Database connection test: {'SUCCESS' if connection_result else 'FAILED'}")
+        if not connection_result:
+            return []
+        
+        # Create test records
+        print("\nCreating test records...")
+        return await create_test_records()
     finally:
-        db.close()
+        # The endpoint tests run on TestClient's event loop, so drop connections opened on this one
+        await engine.dispose()
 
 def main():
     # Test database connection
     print(f"\nTesting database connection...")
-    print("Testing database connection with configured environment variables...")
-    connection_result = check_db_connection()
-    print(f"Database connection test: {'SUCCESS' if connection_result else 'FAILED'}")
-
-    if not connection_result:
+    test_aids = asyncio.run(prepare_database())
+    if not test_aids:
         print("Database connection failed. Exiting...")
         sys.exit(1)
+    test_aid = test_aids[0]
+    print(f"Created test records with aids: {', '.join(test_aids)}")
 
-    # Create test record
-    print("\nCreating test record...")
-    test_aid = create_test_record()
-    print(f"Created test record with aid: {test_aid}")
-
-    # Start server in a separate process
-    print("\nStarting server for endpoint tests...")
-    server = Process(target=run_server)
-    server.start()
-    
-    # Wait for server to start
-    time.sleep(2)
-    
-    try:
+    # Run the app in-process; the context manager also runs the startup/shutdown hooks
+    print("\nStarting in-process client for endpoint tests...")
+    with TestClient(app) as client:
         # Test health check endpoint
         print("\nTesting health check endpoint...")
-        health_response = requests.get("http://localhost:8000/healthz")
+        health_response = client.get("/healthz")
         print(f"Health check status code: {health_response.status_code}")
         print(f"Health check response: {health_response.json()}")
         
         # Test /api/history endpoint
         print("\nTesting /api/history endpoint...")
-        history_response = requests.get("http://localhost:8000/api/history")
+        history_response = client.get("/api/history")
         print(f"History status code: {history_response.status_code}")
         history_data = history_response.json()
         print(f"History records count: {len(history_data)}")
         
         # Test /api/history/{aid} endpoint
         print(f"\nTesting /api/history/{test_aid} endpoint...")
-        record_response = requests.get(f"http://localhost:8000/api/history/{test_aid}")
+        record_response = client.get(f"/api/history/{test_aid}")
         print(f"Record status code: {record_response.status_code}")
         if record_response.status_code == 200:
             record_data = record_response.json()
@@ -82,8 +84,8 @@ def main():
         
         # Test non-existent record
         print("\nTesting non-existent record...")
-        fake_aid = str(uuid.uuid4())
-        not_found_response = requests.get(f"http://localhost:8000/api/history/{fake_aid}")
+        fake_aid = uuid.uuid4().hex
+        not_found_response = client.get(f"/api/history/{fake_aid}")
         print(f"Not found status code: {not_found_response.status_code}")
         
         # Verify all tests passed
@@ -100,11 +102,6 @@ def main():
         else:
             print("\nSome tests failed!")
             sys.exit(1)
-    
-    finally:
-        # Clean up
-        server.terminate()
-        server.join()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,48 @@
+from app.services.analysis_service import _needs_llm
+from app.services.github_service import GitHubService
+
+KOTLIN_PATCH = (
+    "+        builder.setPublicVersion(publicNotification)\n"
+    "+        builder.setVisibility(NotificationCompat.VISIBILITY_PRIVATE)\n"
+)
+
+def build_file_change(filename, patch):
+    # Detection needs no token or HTTP client
+    service = object.__new__(GitHubService)
+    return service._build_file_change({
+        "filename": filename,
+        "status": "modified",
+        "additions": 2,
+        "deletions": 0,
+        "changes": 2,
+        "patch": patch
+    })
+
+def test_kotlin_file_is_detected_and_analyzed():
+    change = build_file_change("app/src/main/java/com/x/Notif.kt", KOTLIN_PATCH)
+    assert change["file_type"] == "kotlin"
+    assert change["is_android_file"]
+    assert [api["api"] for api in change["android_api_changes"]] == ["setPublicVersion", "setVisibility"]
+    assert _needs_llm(change)
+
+def test_manifest_is_analyzed():
+    change = build_file_change("app/src/main/AndroidManifest.xml", '+    <uses-permission android:name="x" />\n')
+    assert change["is_android_file"]
+    assert _needs_llm(change)
+
+def test_gradle_build_files_are_analyzed():
+    for filename in ("app/build.gradle.kts", "app/build.gradle", "gradle/libs.versions.toml", "gradle.properties"):
+        change = build_file_change(filename, "+    targetSdk = 35\n")
+        assert change["file_type"] == "gradle"
+        assert _needs_llm(change)
+
+def test_api_calls_detected_outside_android_paths():
+    change = build_file_change("lib/src/Notif.kt", KOTLIN_PATCH)
+    assert not change["is_android_file"]
+    assert change["android_api_changes"]
+    assert _needs_llm(change)
+
+def test_unrecognized_file_without_api_changes_skips_llm():
+    change = build_file_change("README.md", "+Some docs\n")
+    assert change["file_type"] == "other"
+    assert not _needs_llm(change)